@@ -11,8 +11,15 @@ import click
 def convert_to_parquet(input_path, output_path):
 
     # Scan CSV into a lazy dataframe to avoid loading it all
-    # into memory
-    pl.scan_csv(input_path, infer_schema=False).sink_parquet(output_path)
+    # into memory. Row group statistics let the geocoder skip
+    # row groups when it filters the address file on street_address.
+    pl.scan_csv(input_path, infer_schema=False).sink_parquet(
+        output_path,
+        compression="zstd",
+        compression_level=3,
+        statistics=True,
+        row_group_size=512_000,
+    )
 
 
 if __name__ == "__main__":
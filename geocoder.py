@@ -1,29 +1,29 @@
-import os
-
-# Set thread pool size to 1 to avoid API rate limits
-# This needs to be set before polars is imported
-# os.environ["POLARS_MAX_THREADS"] = "1"
-
 import yaml
 import polars as pl
 import requests
 import click
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import partial
-from utils.encoder import detect_file_encoding, recode_to_utf8
+from importlib.metadata import version
+from utils.encoder import detect_file_encoding, needs_recode, recode_to_utf8
 from utils.parse_address import (
     find_address_fields,
-    parse_address,
-    infer_city_state_field,
-    is_non_philly_from_full_address,
-    is_non_philly_from_split_address,
+    parse_addresses,
+    flag_non_philly_expr,
+    tag_full_addresses_expr,
+    load_parse_cache,
+    save_parse_cache,
+    PARSED_ADDRESS,
 )
-from utils.ais_lookup import ais_lookup
-from utils.tomtom_lookup import tomtom_lookup
-from utils.zips import ZIPS
-from mapping.ais_properties_fields import POSSIBLE_FIELDS
+from utils.ais_lookup import ais_lookup, AIS_MAX_WORKERS
+from utils.tomtom_lookup import tomtom_lookup, TOMTOM_MAX_WORKERS
+from utils.session import build_session
+from utils.lookup_cache import LookupCache
+from utils.zips import ZIPS, ZIPS_SERIES
+from mapping.ais_properties_fields import POSSIBLE_FIELDS, REVERSE_POSSIBLE_FIELDS
 from passyunk.parser import PassyunkParser
 from pathlib import PurePath
 
@@ -33,65 +33,51 @@ def get_current_time():
     return current_datetime.strftime("%H:%M:%S")
 
 
-def split_non_philly_address(config, lf: pl.LazyFrame) -> pl.LazyFrame:
+def split_non_philly_address(address_fields: dict, lf: pl.LazyFrame) -> pl.LazyFrame:
     """
     Given a polars LazyFrame, splits into two lazy frames:
     One for addresses located in Philadelphia, one for addresses
     not located in Philadelphia.
 
+    Args:
+        address_fields: The address fields in use, as resolved by
+        find_address_fields and renamed in process_csv
+        lf: The polars lazyframe to split
+
     Returns:
         (philly_lf, non_philly_lf)
     """
 
-    fields = infer_city_state_field(config)
-
     # If we are using full address field, we need to look up
     # against us-address.
-    full_address_field = fields.get("full_address")
-
-    location_struct = pl.Struct(
-        [pl.Field("is_non_philly", pl.Boolean), pl.Field("is_undefined", pl.Boolean)]
-    )
+    full_address_field = address_fields.get("full_address")
 
     if full_address_field:
-        non_philly_fn = partial(is_non_philly_from_full_address, philly_zips=ZIPS)
+        lf = lf.with_columns(
+            tag_full_addresses_expr(pl.col(full_address_field)).alias("location_info")
+        )
 
-        flagged = lf.with_columns(
-            pl.col(full_address_field)
-            .map_elements(non_philly_fn, return_dtype=location_struct)
-            .alias("location_info")
-        ).unnest("location_info")
+        location = pl.col("location_info").struct
+        city, state, zip_code = (
+            location.field("city"),
+            location.field("state"),
+            location.field("zip"),
+        )
 
     # Otherwise, get address columns from config
     else:
-        city_col = fields.get("city")
-        state_col = fields.get("state")
-        zip_col = fields.get("zip")
-
-        # Make an address struct based on which fields exist
-        address_struct = pl.struct(
-            [
-                (pl.col(city_col) if city_col else pl.lit(None, dtype=pl.Utf8)).alias(
-                    "city"
-                ),
-                (pl.col(state_col) if state_col else pl.lit(None, dtype=pl.Utf8)).alias(
-                    "state"
-                ),
-                (pl.col(zip_col) if zip_col else pl.lit(None, dtype=pl.Utf8)).alias(
-                    "zip"
-                ),
-            ]
-        )
+        city_col = address_fields.get("city")
+        state_col = address_fields.get("state")
+        zip_col = address_fields.get("zip")
+
+        city = pl.col(city_col) if city_col else pl.lit(None, dtype=pl.Utf8)
+        state = pl.col(state_col) if state_col else pl.lit(None, dtype=pl.Utf8)
+        zip_code = pl.col(zip_col) if zip_col else pl.lit(None, dtype=pl.Utf8)
 
-        # Partial helper function for searching for non philly records
-        # used for mapping with polars
-        non_philly_fn = partial(is_non_philly_from_split_address, zips=ZIPS)
+    flagged = lf.with_columns(flag_non_philly_expr(city, state, zip_code, ZIPS_SERIES))
 
-        flagged = lf.with_columns(
-            address_struct.map_elements(
-                non_philly_fn, return_dtype=location_struct
-            ).alias("location_info")
-        ).unnest("location_info")
+    if full_address_field:
+        flagged = flagged.drop("location_info")
 
     non_philly_lf = flagged.filter(pl.col("is_non_philly"))
     philly_lf = flagged.filter(~pl.col("is_non_philly"))
@@ -100,7 +86,7 @@ def split_non_philly_address(config, lf: pl.LazyFrame) -> pl.LazyFrame:
 
 
 def parse_with_passyunk_parser(
-    parser, address_col: str, lf: pl.LazyFrame
+    parser, address_col: str, lf: pl.LazyFrame, cache: dict = None
 ) -> pl.LazyFrame:
     """
     Given a polars LazyFrame, parses addresses in that LazyFrame
@@ -110,26 +96,26 @@ def parse_with_passyunk_parser(
         parser: A passyunk parser instance
         address_col: The address column to parse
         lf: The polars lazyframe with an address field to parse
+        cache: Optional dict of already parsed addresses, filled in with
+        any new addresses as the lazyframe is evaluated
 
     Returns:
         A polars lazyframe with output address, and address validity booleans
         added.
     """
 
-    # Create struct of columns to be filled by parse address function
-    new_cols = pl.Struct(
-        [
-            pl.Field("output_address", pl.String),
-            pl.Field("is_addr", pl.Boolean),
-            pl.Field("is_philly_addr", pl.Boolean),
-            pl.Field("is_multiple_match", pl.Boolean),
-            pl.Field("geocoder_used", pl.String),
-        ]
-    )
+    # Polars may evaluate this expression more than once as the plan
+    # branches, so share parsed addresses between evaluations
+    if cache is None:
+        cache = {}
 
     lf = lf.with_columns(
         pl.col(address_col)
-        .map_elements(lambda s: parse_address(parser, s), return_dtype=new_cols)
+        .map_batches(
+            partial(parse_addresses, parser, cache=cache),
+            return_dtype=PARSED_ADDRESS,
+            is_elementwise=True,
+        )
         .alias("passyunk_struct")
     ).unnest("passyunk_struct")
 
@@ -150,7 +136,7 @@ def build_enrichment_fields(config: dict) -> tuple[list, list]:
     ais_enrichment_fields = config["enrichment_fields"]
 
     invalid_fields = [
-        item for item in ais_enrichment_fields if item not in POSSIBLE_FIELDS.keys()
+        item for item in ais_enrichment_fields if item not in POSSIBLE_FIELDS
     ]
 
     if invalid_fields:
@@ -160,12 +146,7 @@ def build_enrichment_fields(config: dict) -> tuple[list, list]:
             f"{to_print}. Please correct these and try again."
         )
 
-    address_file_fields = []
-
-    [
-        address_file_fields.append(POSSIBLE_FIELDS[item])
-        for item in ais_enrichment_fields
-    ]
+    address_file_fields = [POSSIBLE_FIELDS[item] for item in ais_enrichment_fields]
 
     # Need street_address for joining
     address_file_fields.append("street_address")
@@ -194,26 +175,30 @@ def add_address_file_fields(
     Args:
         geo_filepath: The filepath to the geography file. This is the main
         file used to geocode addresses.
-        input_data: A lazyframe containing the input data to be enriched
+        input_data: A lazyframe containing the input data to be enriched.
+        Input columns that conflict with enrichment fields must already
+        have been renamed.
         address_fields: A list of one or more address fields
     """
     addresses = pl.scan_parquet(geo_filepath)
     addresses = addresses.select(address_fields)
 
-    # Check which enrichment fields would conflict with existing columns
-    existing_cols = input_data.collect_schema().names()
-    enrichment_col_names = [
-        key for key, value in POSSIBLE_FIELDS.items() if value in address_fields
-    ]
-    conflicts = [field for field in enrichment_col_names if field in existing_cols]
-
-    # Rename conflicting input columns to _left
-    if conflicts:
-        rename_input = {field: field + "_left" for field in conflicts}
-        input_data = input_data.rename(rename_input)
+    # Narrow the address file down to the addresses that appear in the
+    # input. The filter is pushed down into the parquet scan, so row groups
+    # without any matching street_address are skipped entirely.
+    input_addresses = (
+        input_data.select(pl.col("output_address").unique().drop_nulls())
+        .collect(engine="streaming")
+        .to_series()
+    )
+    addresses = addresses.filter(
+        pl.col("street_address").is_in(input_addresses.implode())
+    )
 
     rename_mapping = {
-        value: key for key, value in POSSIBLE_FIELDS.items() if value in address_fields
+        field: REVERSE_POSSIBLE_FIELDS[field]
+        for field in address_fields
+        if field in REVERSE_POSSIBLE_FIELDS
     }
 
     joined_lf = input_data.join(
@@ -248,49 +233,130 @@ def split_geos(data: pl.LazyFrame, config: dict):
     Splits a lazyframe into two lazy frames: one for records with latitude
     and longitude, and another for records without latitude and longitude.
     Used to determine which records need to be added using AIS.
+
+    The data is collected once and partitioned on the has-coordinates mask,
+    so both halves come from a single evaluation of the upstream plan.
     """
 
     srid_4326 = config.get("srid_4326")
     srid_2272 = config.get("srid_2272")
 
     if srid_4326:
-        has_geo = data.filter(
-            (~pl.col("geocode_lat").is_null()) & (~pl.col("geocode_lon").is_null())
-        )
-        needs_geo = data.filter(
-            (pl.col("geocode_lat").is_null()) | (pl.col("geocode_lon").is_null())
+        has_geo_mask = (
+            pl.col("geocode_lat").is_not_null() & pl.col("geocode_lon").is_not_null()
         )
-    
+
     elif srid_2272:
-        has_geo = data.filter(
-            (~pl.col("geocode_x").is_null()) & (~pl.col("geocode_y").is_null())
-        )
-        needs_geo = data.filter(
-            (pl.col("geocode_x").is_null()) | (pl.col("geocode_y").is_null())
+        has_geo_mask = (
+            pl.col("geocode_x").is_not_null() & pl.col("geocode_y").is_not_null()
         )
-    
+
     else:
         raise ValueError("Either SRID 4326 or SRID 2272 must be specified.")
-    
+
+    tagged = data.with_columns(has_geo_mask.alias("__has_geo__")).collect(
+        engine="streaming"
+    )
+    parts = tagged.partition_by("__has_geo__", as_dict=True, include_key=False)
+    empty = tagged.clear().drop("__has_geo__")
+
+    has_geo = parts.get((True,), empty).lazy()
+    needs_geo = parts.get((False,), empty).lazy()
+
     return (has_geo, needs_geo)
 
 
+def lookup_distinct(
+    lf: pl.LazyFrame,
+    lookup_cols: list,
+    lookup_fn,
+    return_dtype: pl.Struct,
+    alias: str,
+    max_workers: int = 1,
+    cache: LookupCache = None,
+    cache_options: dict = None,
+) -> pl.LazyFrame:
+    """
+    Calls an API lookup function once for each distinct combination of
+    lookup columns in a lazyframe, then joins the results back onto every
+    row with those values. Input files often repeat the same address, and
+    this keeps each repeat from costing another API call.
+
+    Args:
+        lf: The lazyframe to enrich
+        lookup_cols: The columns the lookup function reads from each row
+        lookup_fn: A function that takes a dict of lookup column values
+        and returns a dict matching return_dtype
+        return_dtype: The struct dtype returned by the lookup function
+        alias: The name of the struct column to add
+        max_workers: How many lookups to run at once. The lookup functions
+        rate limit themselves, so this only overlaps time spent waiting
+        on responses.
+        cache: Optional on-disk cache of earlier lookup results. Only rows
+        without a cached result are looked up, and their results are saved.
+        cache_options: Settings that change the lookup function's results
+        for the same row, added to the cache key so results looked up with
+        different settings aren't mixed.
+
+    Returns:
+        The lazyframe with a struct column of lookup results added.
+    """
+    lookups = (
+        lf.select(lookup_cols)
+        .unique(maintain_order=True)
+        .collect(engine="streaming")
+    )
+    rows = list(lookups.iter_rows(named=True))
+
+    if cache is None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lookup_fn, rows))
+
+    else:
+        fields = [field.name for field in return_dtype.fields]
+        keys = [cache.make_key(alias, fields, list(row.values()), cache_options) for row in rows]
+        cached = cache.get_many(keys)
+        misses = [(key, row) for key, row in zip(keys, rows) if key not in cached]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            fetched = executor.map(lookup_fn, [row for _, row in misses])
+            fetched = {key: result for (key, _), result in zip(misses, fetched)}
+
+        cache.put_many(fetched)
+        cached.update(fetched)
+        results = [cached[key] for key in keys]
+
+    results = pl.Series(alias, results, dtype=return_dtype)
+
+    return lf.join(
+        lookups.with_columns(results).lazy(),
+        on=lookup_cols,
+        how="left",
+        nulls_equal=True,
+        maintain_order="left",
+    )
+
+
 def enrich_with_ais(
+    sess: requests.Session,
     config: dict,
     to_add: pl.LazyFrame,
-    full_address_field: bool,
+    zip_field: str,
     enrichment_fields: list,
+    cache: LookupCache = None,
 ) -> pl.LazyFrame:
     """
     Enrich a lazyframe with user-specified columns from AIS.
 
     Args:
+        sess (requests Session object): The session to make API calls with
         config (dict): A dictionary of config information. Used
         to make API calls.
         to_add (polars LazyFrame): A lazyframe of data to enrich
-        full_address_field (bool): Whether or not the user has specified
-        that the input data has a full address field
+        zip_field (str): The input zip column, used to tiebreak
+        multiple matches. None if a full address field is used.
         enrichment_fields: A list of fields to add to the lazyframe.
+        cache (LookupCache): Optional on-disk cache of earlier lookups
     """
 
     # Created augmented address for undefined locations
@@ -304,6 +370,7 @@ def enrich_with_ais(
     # Build struct based on config
     srid_4326 = config.get("srid_4326")
     srid_2272 = config.get("srid_2272")
+    derive_2272 = config.get("derive_2272_locally", False)
 
     struct_fields = [
     pl.Field("output_address", pl.String),
@@ -334,93 +401,85 @@ def enrich_with_ais(
     API_KEY = config.get("AIS_API_KEY")
     field_names = [f.name for f in new_cols.fields]
 
-    with requests.Session() as sess:
-        addr_cfg = config.get("address_fields") or {}
-        zip_field = addr_cfg.get("zip")
-
-        # Don't include zip field if full address field is specified
-        # Use API address to account for cases where we must
-        # assume that address is in Philadelphia
-        if zip_field and not full_address_field:
-            struct_expr = pl.struct(
-                [
-                    "api_address",
-                    "output_address",
-                    zip_field,
-                    "is_addr",
-                    "is_philly_addr",
-                ]
-            ).map_elements(
-                lambda s: ais_lookup(
-                    sess,
-                    API_KEY,
-                    s["api_address"],
-                    s[zip_field],
-                    enrichment_fields,
-                    s["is_addr"],
-                    s["is_philly_addr"],
-                    s["output_address"],
-                    srid_4326,
-                    srid_2272
-                ),
-                return_dtype=new_cols,
-            )
-        else:
-            struct_expr = pl.struct(
-                ["api_address", "output_address", "is_addr", "is_philly_addr"]
-            ).map_elements(
-                lambda s: ais_lookup(
-                    sess,
-                    API_KEY,
-                    s["api_address"],
-                    None,
-                    enrichment_fields,
-                    s["is_addr"],
-                    s["is_philly_addr"],
-                    s["output_address"],
-                    srid_4326,
-                    srid_2272
-                ),
-                return_dtype=new_cols,
-            )
-
-        tmp_name = "ais_struct"
+    # Use API address to account for cases where we must
+    # assume that address is in Philadelphia
+    lookup_cols = ["api_address", "output_address", "is_addr", "is_philly_addr"]
+    if zip_field:
+        lookup_cols.append(zip_field)
+
+    def lookup_fn(s):
+        return ais_lookup(
+            sess,
+            API_KEY,
+            s["api_address"],
+            s[zip_field] if zip_field else None,
+            enrichment_fields,
+            s["is_addr"],
+            s["is_philly_addr"],
+            s["output_address"],
+            srid_4326,
+            srid_2272,
+            derive_2272,
+        )
 
-        added = (
-            to_add.with_columns(struct_expr.alias(tmp_name))
-            .with_columns(
-                *[pl.col(tmp_name).struct.field(n).alias(n) for n in field_names]
-            )
-            .drop(tmp_name, "api_address")  # Drop the temporary api_address column
+    tmp_name = "ais_struct"
+
+    added = (
+        lookup_distinct(
+            to_add,
+            lookup_cols,
+            lookup_fn,
+            new_cols,
+            tmp_name,
+            max_workers=AIS_MAX_WORKERS,
+            cache=cache,
+            cache_options={"derive_2272": derive_2272},
         )
+        .with_columns(
+            *[pl.col(tmp_name).struct.field(n).alias(n) for n in field_names]
+        )
+        .drop(tmp_name, "api_address")  # Drop the temporary api_address column
+    )
 
     return added
 
 
-def enrich_with_tomtom(parser, config: dict, to_add: pl.LazyFrame) -> pl.LazyFrame:
+def enrich_with_tomtom(
+    sess: requests.Session,
+    parser,
+    config: dict,
+    to_add: pl.LazyFrame,
+    cache: LookupCache = None,
+) -> pl.LazyFrame:
     """
     Enrich a lazy frame with latitude and longitude from TomTom.
 
     Args:
+        sess: A requests Session object, used to make API calls
         parser: A passyunk parser object. Used to standardize TomTom output.
         config: A dictionary containing config information
         to_add: A polars lazyframe to be enriched
+        cache: Optional on-disk cache of earlier lookups
 
     Returns:
         An enriched polars lazyframe.
     """
 
-    # Create augmented address for undefined locations
-    
+    # Create augmented address for undefined locations. Whitespace is
+    # cleaned up here rather than in process_csv so that only the rows
+    # that need TomTom pay for the regex.
+    raw_address = pl.col("raw_address").str.replace_all(r"\s+", " ").str.strip_chars()
+
     to_add = to_add.with_columns(
         pl.when(pl.col("is_undefined"))
-        .then(pl.concat_str([pl.col("raw_address"), pl.lit(", Philadelphia, PA")]))
-        .otherwise(pl.col("raw_address"))
+        .then(pl.concat_str([raw_address, pl.lit(", Philadelphia, PA")]))
+        .otherwise(raw_address)
         .alias("raw_api_address")
     )
 
     srid_4326 = config.get("srid_4326")
     srid_2272 = config.get("srid_2272")
+    derive_2272 = config.get("derive_2272_locally", False)
 
     struct_fields = [
         pl.Field("output_address", pl.String),
@@ -444,34 +503,36 @@ def enrich_with_tomtom(parser, config: dict, to_add: pl.LazyFrame) -> pl.LazyFra
     new_cols = pl.Struct(struct_fields)
     field_names = [f.name for f in new_cols.fields]
 
-    with requests.Session() as sess:
-        added = (
-            # Use the joined raw (not parsed with passyunk) address for tomtom, as passyunk parser 
-            # may sometimes strip out key information
-            to_add.with_columns(
-                pl.struct(["raw_api_address", "output_address"])
-                .map_elements(
-                    lambda cols: tomtom_lookup(
-                        sess,
-                        parser,
-                        ZIPS,
-                        cols["raw_api_address"],
-                        cols["output_address"],
-                        srid_4326,
-                        srid_2272,
-                    ),
-                    return_dtype=new_cols,
-                )
-                .alias("tomtom_struct")
-            )
-            .with_columns(
-                *[
-                    pl.col("tomtom_struct").struct.field(n).alias(n)
-                    for n in field_names
-                ]
-            )
-            .drop("tomtom_struct", "raw_api_address")
+    # Use the joined raw (not parsed with passyunk) address for tomtom, as passyunk parser 
+    # may sometimes strip out key information
+    added = (
+        lookup_distinct(
+            to_add,
+            ["raw_api_address", "output_address"],
+            lambda cols: tomtom_lookup(
+                sess,
+                parser,
+                ZIPS,
+                cols["raw_api_address"],
+                cols["output_address"],
+                srid_4326,
+                srid_2272,
+                derive_2272,
+            ),
+            new_cols,
+            "tomtom_struct",
+            max_workers=TOMTOM_MAX_WORKERS,
+            cache=cache,
+            cache_options={"derive_2272": derive_2272},
         )
+        .with_columns(
+            *[
+                pl.col("tomtom_struct").struct.field(n).alias(n)
+                for n in field_names
+            ]
+        )
+        .drop("tomtom_struct", "raw_api_address")
+    )
 
     return added
 
@@ -484,13 +545,21 @@ def enrich_with_tomtom(parser, config: dict, to_add: pl.LazyFrame) -> pl.LazyFra
     show_default="./config.yml",
     help="The path to the config file.",
 )
-def process_csv(config_path):
+@click.option(
+    "--output_format",
+    default="csv",
+    type=click.Choice(["csv", "parquet"]),
+    show_default=True,
+    help="The file format to write the enriched output in.",
+)
+def process_csv(config_path, output_format):
     """
     Given a config file with the csv filepath, normalizes records
     in that file using Passyunk.
 
     Args:
         config_path (str): The path to the config file
+        output_format (str): Whether to write the output as csv or parquet
     """
     current_time = get_current_time()
     print(f"Beginning enrichment process at {current_time}.")
@@ -529,7 +598,7 @@ def process_csv(config_path):
 
     # If encoding is not UTF-8, recode it
     utf8_filepath = ""
-    if encoding != "UTF-8":
+    if needs_recode(filepath, encoding):
         print(f"Converting file encoding from {encoding} to UTF-8")
 
         with tempfile.NamedTemporaryFile(
@@ -540,6 +609,14 @@ def process_csv(config_path):
         recode_to_utf8(filepath, utf8_filepath, encoding)
         filepath = utf8_filepath
 
+    # One session for every AIS and TomTom lookup in the run
+    sess = build_session(pool_size=max(AIS_MAX_WORKERS, TOMTOM_MAX_WORKERS))
+
+    # Reuse AIS and TomTom results from earlier runs, if a cache file is
+    # configured. Otherwise keep them in memory, so an address that comes
+    # up again in the second AIS pass isn't looked up twice in one run.
+    lookup_cache = LookupCache(config.get("lookup_cache_file") or ":memory:")
+
     try:
         # infer schema = False infers everything as a string. Otherwise, polars
         # will attempt to infer zip codes like 19114-3409 as an int
@@ -561,6 +638,40 @@ def process_csv(config_path):
                 f"file are not present in the input file: {diff}"
             )
 
+        # Generate the names of columns to add for both the AIS API
+        # and the address file
+        ais_enrichment_fields, address_file_enrichment_fields = build_enrichment_fields(
+            config
+        )
+
+        # Rename input columns that conflict with enrichment fields to _left
+        conflicts = {
+            field: field + "_left"
+            for field in file_cols
+            if field in ais_enrichment_fields
+        }
+
+        if conflicts:
+            lf = lf.rename(conflicts)
+            file_cols = [conflicts.get(field, field) for field in file_cols]
+            address_fields = {
+                key: conflicts.get(field, field) for key, field in address_fields.items()
+            }
+            address_fields_list = [conflicts.get(field, field) for field in address_fields_list]
+
+        # Only the address fields are needed for geocoding. The remaining
+        # input columns are set aside and rejoined on __geocode_idx__ when
+        # the output is written, so they aren't carried through every join,
+        # filter, and concat below.
+        address_fields_list = list(dict.fromkeys(address_fields_list))
+        passthrough_cols = [
+            field
+            for field in file_cols
+            if field not in address_fields_list and field != "__geocode_idx__"
+        ]
+        passthrough_lf = lf.select("__geocode_idx__", *passthrough_cols)
+        lf = lf.select("__geocode_idx__", *address_fields_list)
+
         # ---------------- Join Addresses to Address File -------------------#
 
         passyunk_address_field = address_fields.get(
@@ -574,52 +685,71 @@ def process_csv(config_path):
         # fails to match
         lf = lf.with_columns(pl.col(passyunk_address_field).alias("raw_address"))
 
-        lf = parse_with_passyunk_parser(parser, passyunk_address_field, lf)
+        # ---------------- Split out Non Philly Addresses -------------------#
+        # Split before parsing, as non philly addresses are only looked up
+        # with TomTom, which doesn't need passyunk output
+        philly_lf, non_philly_lf = split_non_philly_address(address_fields, lf)
+
+        # Reuse addresses parsed in earlier runs, if a cache file is configured
+        parse_cache_path = config.get("parse_cache_file")
+        passyunk_version = version("passyunk")
+        parse_cache = load_parse_cache(parse_cache_path, passyunk_version)
+
+        philly_lf = parse_with_passyunk_parser(
+            parser, passyunk_address_field, philly_lf, parse_cache
+        )
+
+        # Give non philly addresses the same values parse_address returns
+        # for an address that isn't on a philly street
+        non_philly_lf = non_philly_lf.with_columns(
+            pl.col(passyunk_address_field).alias("output_address"),
+            pl.lit(False).alias("is_addr"),
+            pl.lit(False).alias("is_philly_addr"),
+            pl.lit(False).alias("is_multiple_match"),
+            pl.lit(None, dtype=pl.String).alias("geocoder_used"),
+        )
 
         # After parsing with Passyunk, rebuild joined_address using the cleaned output_address
         # Only do this for split address fields (street/city/state/zip)
         # Don't do this for full_address fields, as Passyunk strips city/state
         if "street_address" in address_fields.keys():
-            # Build list of available location components
+            # Build list of available location components. Blank components
+            # are nulled out so concat_str skips them instead of leaving
+            # doubled spaces behind.
             location_components = []
             for key in ["city", "state", "zip"]:
                 if key in address_fields.keys() and address_fields[key] is not None:
+                    component = pl.col(address_fields[key]).str.strip_chars()
                     location_components.append(
-                        pl.col(address_fields[key]).fill_null("")
+                        pl.when(component != "").then(component)
                     )
 
-            lf = lf.with_columns(
+            address_cols = [
                 pl.when(pl.col("output_address").is_not_null())
                 .then(
                     pl.concat_str(
                         [pl.col("output_address")] + location_components,
                         separator=" ",
+                        ignore_nulls=True,
                     )
-                    .str.replace_all(r"\s+", " ")
-                    .str.strip_chars()
                 )
                 .otherwise(pl.col(passyunk_address_field))
                 .alias("joined_address"),
 
+                # Whitespace inside the raw address is collapsed in
+                # enrich_with_tomtom, only for the rows sent to TomTom
                 pl.concat_str(
-                [pl.col("raw_address")] + location_components,
-                separator=" ",
-                ).str.replace_all(r"\s+", " ")\
-                    .str.strip_chars()\
-                        .alias("raw_address"),  # overwrite raw_address in place
-            )
+                    [pl.col("raw_address")] + location_components,
+                    separator=" ",
+                    ignore_nulls=True,
+                ).alias("raw_address"),  # overwrite raw_address in place
+            ]
         else:
             # For full_address cases, use the original field as joined_address
-            lf = lf.with_columns(pl.col(passyunk_address_field).alias("joined_address"))
-
-        # ---------------- Split out Non Philly Addresses -------------------#
-        philly_lf, non_philly_lf = split_non_philly_address(config, lf)
+            address_cols = [pl.col(passyunk_address_field).alias("joined_address")]
 
-        # Generate the names of columns to add for both the AIS API
-        # and the address file
-        ais_enrichment_fields, address_file_enrichment_fields = build_enrichment_fields(
-            config
-        )
+        philly_lf = philly_lf.with_columns(address_cols)
+        non_philly_lf = non_philly_lf.with_columns(address_cols)
 
         joined_lf = add_address_file_fields(
             geo_filepath, philly_lf, address_file_enrichment_fields, config
@@ -631,12 +761,18 @@ def process_csv(config_path):
         # -------------------------- Add Fields from AIS ------------------ #
         has_geo, needs_geo = split_geos(joined_lf, config)
 
-        uses_full_address = bool(address_fields.get("full_address"))
+        # address_fields only has a zip when split address fields are used
+        zip_field = address_fields.get("zip")
         ais_enriched = enrich_with_ais(
-            config, needs_geo, uses_full_address, ais_enrichment_fields
+            sess,
+            config,
+            needs_geo,
+            zip_field,
+            ais_enrichment_fields,
+            lookup_cache,
         )
 
-        ais_rejoined = pl.concat([has_geo, ais_enriched]).sort("__geocode_idx__")
+        ais_rejoined = pl.concat([has_geo, ais_enriched])
 
         # -------------- Check Match Failures Against TomTom ------------------ #
 
@@ -644,11 +780,11 @@ def process_csv(config_path):
 
         # Rejoin the addresses marked as non-philly for tomtom search
         # at the beginning of the process
-        needs_geo = pl.concat([non_philly_lf, needs_geo], how="diagonal").sort(
-            "__geocode_idx__"
-        )
+        needs_geo = pl.concat([non_philly_lf, needs_geo], how="diagonal")
 
-        tomtom_enriched = enrich_with_tomtom(parser, config, needs_geo)
+        tomtom_enriched = enrich_with_tomtom(
+            sess, parser, config, needs_geo, lookup_cache
+        )
 
         # -------------- Check TomTom matches against AIS again ---------------- #
         
@@ -666,7 +802,14 @@ def process_csv(config_path):
         tomtom_enriched_non_philly = tomtom_enriched.filter(pl.col("is_non_philly"))
         tomtom_enriched_is_philly = tomtom_enriched.filter(~pl.col("is_non_philly"))
 
-        ais_reinriched = enrich_with_ais(config, tomtom_enriched_is_philly, uses_full_address, ais_enrichment_fields)
+        ais_reinriched = enrich_with_ais(
+            sess,
+            config,
+            tomtom_enriched_is_philly,
+            zip_field,
+            ais_enrichment_fields,
+            lookup_cache,
+        )
 
         reinriched_has_geo, reinriched_needs_geo = split_geos(ais_reinriched, config)
 
@@ -685,12 +828,11 @@ def process_csv(config_path):
         reinriched_rejoined = pl.concat([reinriched_has_geo, tomtom_fallback], how="diagonal").select(cols)
         non_philly_rejoined = pl.concat([tomtom_enriched_non_philly, reinriched_rejoined], how="diagonal").select(cols)
 
-        rejoined = (
-            pl.concat([has_geo, non_philly_rejoined])
-            .sort("__geocode_idx__")
-            .drop(
-                ["__geocode_idx__", "joined_address", "is_non_philly", "is_undefined", "raw_address"]
-            )
+        # Row order doesn't matter until the output is written. Joining
+        # back onto the passthrough columns below restores the input order,
+        # so none of the concats need to be sorted on __geocode_idx__.
+        rejoined = pl.concat([has_geo, non_philly_rejoined]).drop(
+            ["joined_address", "is_non_philly", "is_undefined", "raw_address"]
         )
 
         # Reorder fields so that all geocode fields are adjacent
@@ -720,6 +862,23 @@ def process_csv(config_path):
         
         # Drop raw address field, no longer need it after tomtom match
         rejoined = rejoined.select(ordered_cols)
+
+        # Rejoin the input columns that were set aside before geocoding,
+        # keeping every input column in its original position and every
+        # row in input file order
+        input_cols = [field for field in file_cols if field != "__geocode_idx__"]
+        overwritten = [field for field in passthrough_cols if field in ordered_cols]
+        added_cols = [
+            field
+            for field in ordered_cols
+            if field not in input_cols and field != "__geocode_idx__"
+        ]
+
+        rejoined = (
+            passthrough_lf.drop(overwritten)
+            .join(rejoined, on="__geocode_idx__", how="left", maintain_order="left")
+            .select(input_cols + added_cols)
+        )
         
         # -------------------- Save Output File ---------------------- #
 
@@ -728,16 +887,33 @@ def process_csv(config_path):
         # If filepath has multiple suffixes, remove them
         stem = in_path.name.replace("".join(in_path.suffixes), "")
 
-        out_path = f"{stem}_enriched.csv"
+        out_path = f"{stem}_enriched.{output_format}"
 
         out_path = str(in_path.parent / out_path)
 
-        rejoined.sink_csv(out_path)
+        if output_format == "parquet":
+            # Statistics let readers of the output skip row groups when
+            # filtering, as the address file does for us
+            rejoined.sink_parquet(
+                out_path,
+                compression="zstd",
+                compression_level=3,
+                row_group_size=100_000,
+                statistics=True,
+            )
+        else:
+            rejoined.sink_csv(out_path)
+
+        if parse_cache_path:
+            save_parse_cache(parse_cache, parse_cache_path, passyunk_version)
 
         current_time = get_current_time()
         print(f"Enrichment complete at {current_time}.")
 
     finally:
+        sess.close()
+        lookup_cache.close()
+
         if utf8_filepath:
             os.remove(utf8_filepath)
 
@@ -78,3 +78,6 @@ POSSIBLE_FIELDS = {
     "engine_local": "engine_local",
     "ladder_local": "ladder_local",
 }
+
+# Maps address file column names back to their AIS field names
+REVERSE_POSSIBLE_FIELDS = {value: key for key, value in POSSIBLE_FIELDS.items()}
@@ -1,4 +1,8 @@
+import pytest
+import polars as pl
 import utils.ais_lookup as ais_lookup
+from geocoder import lookup_distinct
+from utils.lookup_cache import LookupCache
 
 
 def test_ais_lookup_creates_address_search_url(monkeypatch):
@@ -238,6 +242,62 @@ def test_ais_lookup_only_fetches_2272(monkeypatch):
     assert "geocode_lon" not in result
 
 
+def test_ais_lookup_derives_2272_without_second_call(monkeypatch):
+    call_count = {"count": 0}
+
+    class FakeResponse:
+        def __init__(self, data, status_code=200):
+            self._data = data
+            self.status_code = status_code
+
+        def json(self):
+            return self._data
+
+    class FakeSession:
+        def get(self, *a, **k):
+            raise AssertionError("should be patched")
+
+    def fake_get(self, url, params=None, timeout=None, **kwargs):
+        call_count["count"] += 1
+
+        return FakeResponse(
+            {
+                "search_type": "address",
+                "features": [
+                    {
+                        "properties": {
+                            "street_address": "1234 MARKET ST",
+                            "zip_code": "19107",
+                        },
+                        "geometry": {"coordinates": [-75.1604719, 39.95191825]},
+                    }
+                ],
+            },
+            200,
+        )
+
+    monkeypatch.setattr(FakeSession, "get", fake_get)
+    sess = FakeSession()
+
+    result = ais_lookup.ais_lookup(
+        sess,
+        "1234",
+        "1234 mkt st",
+        "19107",
+        [],
+        fetch_4326=True,
+        fetch_2272=True,
+        derive_2272=True,
+    )
+
+    assert call_count["count"] == 1
+    assert result["geocode_lon"] == "-75.1604719"
+    assert result["geocode_lat"] == "39.95191825"
+    # Within a foot of what the 2272 search returns for this point
+    assert abs(float(result["geocode_x"]) - 2694392.48) < 1
+    assert abs(float(result["geocode_y"]) - 235985.5) < 1
+
+
 def test_ais_lookup_tiebreaks(monkeypatch):
     created = {}
     call_count = {"count": 0}
@@ -464,4 +524,73 @@ def test_false_address_returns_input_address_if_bad_address(monkeypatch):
         "output_address": "123 fake st",
         "is_multiple_match": False,
         "geocoder_used": None,
-    }
\ No newline at end of file
+    }
+
+
+@pytest.mark.parametrize("status_code", [401, 403, 400, 407])
+def test_ais_lookup_error_response_is_not_cached(monkeypatch, tmp_path, status_code):
+    class FakeResponse:
+        def __init__(self, data, status_code=200):
+            self._data = data
+            self.status_code = status_code
+            self.text = ""
+
+        def json(self):
+            return self._data
+
+    class FakeSession:
+        def get(self, *a, **k):
+            raise AssertionError("Should be patched")
+
+    responses = {"status_code": status_code}
+
+    def fake_get(self, url, params=None, timeout=None, **kwargs):
+        return FakeResponse(
+            {
+                "search_type": "address",
+                "features": [
+                    {
+                        "properties": {"street_address": "1234 MARKET ST"},
+                        "geometry": {"coordinates": [-75.16, 39.95]},
+                    }
+                ],
+            },
+            responses["status_code"],
+        )
+
+    monkeypatch.setattr(FakeSession, "get", fake_get)
+    sess = FakeSession()
+
+    def lookup_fn(row):
+        # Skip the retry decorator's backoff
+        return ais_lookup.ais_lookup.__wrapped__(
+            sess,
+            "1234",
+            row["address"],
+            enrichment_fields=[],
+            fetch_4326=True,
+            fetch_2272=False,
+        )
+
+    lf = pl.LazyFrame({"address": ["1234 market st"]})
+    return_dtype = pl.Struct(
+        [
+            pl.Field("output_address", pl.String),
+            pl.Field("is_addr", pl.Boolean),
+            pl.Field("geocode_lat", pl.String),
+            pl.Field("geocode_lon", pl.String),
+        ]
+    )
+    cache = LookupCache(str(tmp_path / "lookups.db"))
+
+    with pytest.raises(Exception, match=str(status_code)):
+        lookup_distinct(lf, ["address"], lookup_fn, return_dtype, "ais", cache=cache)
+
+    # Once the problem is fixed, the address is looked up again
+    responses["status_code"] = 200
+    result = lookup_distinct(
+        lf, ["address"], lookup_fn, return_dtype, "ais", cache=cache
+    ).collect()
+    cache.close()
+
+    assert result["ais"].struct.field("is_addr").to_list() == [True]
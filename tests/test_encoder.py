@@ -0,0 +1,51 @@
+from utils.encoder import (
+    DETECT_SAMPLE_BYTES,
+    detect_file_encoding,
+    needs_recode,
+    recode_to_utf8,
+)
+
+
+def test_needs_recode_skips_ascii_and_utf8(tmp_path):
+    ascii_file = tmp_path / "ascii.csv"
+    ascii_file.write_bytes(b"address\n1234 Market St\n")
+    utf8_file = tmp_path / "utf8.csv"
+    utf8_file.write_text("address\n1234 Café St\n" * 50, encoding="utf-8")
+
+    assert not needs_recode(ascii_file, detect_file_encoding(ascii_file))
+    assert not needs_recode(utf8_file, detect_file_encoding(utf8_file))
+    assert needs_recode(ascii_file, "UTF-8-SIG")
+    assert needs_recode(ascii_file, "Windows-1252")
+    assert needs_recode(ascii_file, None)
+
+
+def test_needs_recode_checks_past_the_detection_sample(tmp_path):
+    # ASCII where the encoding is detected, cp1252 further into the file
+    src = tmp_path / "late_cp1252.csv"
+    src.write_bytes(
+        b"a" * DETECT_SAMPLE_BYTES + "\n1234 Café St\n".encode("cp1252")
+    )
+
+    assert detect_file_encoding(src) == "ascii"
+    assert needs_recode(src, detect_file_encoding(src))
+
+
+def test_recode_to_utf8_converts_file(tmp_path):
+    src = tmp_path / "cp1252.csv"
+    src.write_bytes("address\n1234 Café St\n".encode("cp1252"))
+    dst = tmp_path / "utf8.csv"
+
+    recode_to_utf8(src, dst, "cp1252")
+
+    assert dst.read_text(encoding="utf-8") == "address\n1234 Café St\n"
+
+
+def test_detect_file_encoding_recognizes_common_encodings(tmp_path):
+    bom_file = tmp_path / "bom.csv"
+    bom_file.write_text("address\n1234 Market St\n", encoding="utf-8-sig")
+    cut_off_file = tmp_path / "cut_off.csv"
+    # The sample ends partway through a multibyte character
+    cut_off_file.write_bytes(b"a" * (DETECT_SAMPLE_BYTES - 1) + "é".encode("utf-8"))
+
+    assert detect_file_encoding(bom_file) == "UTF-8-SIG"
+    assert detect_file_encoding(cut_off_file) == "utf-8"
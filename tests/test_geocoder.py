@@ -1,5 +1,9 @@
 import pytest
-from geocoder import build_enrichment_fields
+import threading
+import time
+import polars as pl
+from geocoder import build_enrichment_fields, lookup_distinct, split_geos
+from utils.lookup_cache import LookupCache
 
 
 def test_build_enrichment_fields_returns_fields_both_srids():
@@ -127,4 +131,135 @@ def test_build_enrichment_fields_errors_if_invalid_field():
     }
 
     with pytest.raises(ValueError):
-        build_enrichment_fields(config)
\ No newline at end of file
+        build_enrichment_fields(config)
+
+
+def test_lookup_distinct_calls_once_per_distinct_row():
+    calls = []
+
+    def fake_lookup(row):
+        calls.append(row)
+        address = row["address"]
+        return {"output_address": address.upper() if address else None}
+
+    lf = pl.LazyFrame(
+        {
+            "address": ["1234 mkt st", "1234 mkt st", None, "500 race st", None],
+            "zip": ["19107", "19107", None, None, None],
+        }
+    )
+    return_dtype = pl.Struct([pl.Field("output_address", pl.String)])
+
+    result = lookup_distinct(
+        lf, ["address", "zip"], fake_lookup, return_dtype, "result", max_workers=2
+    ).collect()
+
+    assert len(calls) == 3
+    assert result["result"].struct.field("output_address").to_list() == [
+        "1234 MKT ST",
+        "1234 MKT ST",
+        None,
+        "500 RACE ST",
+        None,
+    ]
+
+
+def test_lookup_distinct_reuses_cached_results(tmp_path):
+    calls = []
+
+    def fake_lookup(row):
+        calls.append(row)
+        return {"output_address": row["address"].upper()}
+
+    lf = pl.LazyFrame({"address": ["1234 mkt st", "500 race st"]})
+    return_dtype = pl.Struct([pl.Field("output_address", pl.String)])
+    cache = LookupCache(str(tmp_path / "lookups.db"))
+
+    first = lookup_distinct(
+        lf, ["address"], fake_lookup, return_dtype, "result", cache=cache
+    ).collect()
+    second = lookup_distinct(
+        lf, ["address"], fake_lookup, return_dtype, "result", cache=cache
+    ).collect()
+    cache.close()
+
+    assert len(calls) == 2
+    assert first.equals(second)
+
+
+def test_lookup_distinct_keeps_cache_options_apart(tmp_path):
+    calls = []
+
+    def fake_lookup(row):
+        calls.append(row)
+        return {"output_address": row["address"].upper()}
+
+    lf = pl.LazyFrame({"address": ["1234 mkt st", "500 race st"]})
+    return_dtype = pl.Struct([pl.Field("output_address", pl.String)])
+    cache = LookupCache(str(tmp_path / "lookups.db"))
+
+    for derive_2272 in [False, True, False]:
+        lookup_distinct(
+            lf,
+            ["address"],
+            fake_lookup,
+            return_dtype,
+            "result",
+            cache=cache,
+            cache_options={"derive_2272": derive_2272},
+        ).collect()
+    cache.close()
+
+    assert len(calls) == 4
+
+
+def test_lookup_distinct_runs_at_most_max_workers_at_once():
+    lock = threading.Lock()
+    in_flight = {"now": 0, "max": 0}
+
+    def fake_lookup(row):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        time.sleep(0.01)
+        with lock:
+            in_flight["now"] -= 1
+        return {"output_address": row["address"].upper()}
+
+    lf = pl.LazyFrame({"address": [f"{n} mkt st" for n in range(20)]})
+    return_dtype = pl.Struct([pl.Field("output_address", pl.String)])
+
+    result = lookup_distinct(
+        lf, ["address"], fake_lookup, return_dtype, "result", max_workers=3
+    ).collect()
+
+    assert 1 < in_flight["max"] <= 3
+    assert result["result"].struct.field("output_address").to_list() == [
+        f"{n} MKT ST" for n in range(20)
+    ]
+
+
+def test_split_geos_partitions_on_coordinates():
+    lf = pl.LazyFrame(
+        {
+            "__geocode_idx__": [0, 1, 2],
+            "geocode_lat": ["39.9", None, "40.0"],
+            "geocode_lon": ["-75.1", "-75.2", None],
+        }
+    )
+
+    has_geo, needs_geo = split_geos(lf, {"srid_4326": True})
+
+    assert has_geo.collect()["__geocode_idx__"].to_list() == [0]
+    assert needs_geo.collect()["__geocode_idx__"].to_list() == [1, 2]
+    assert needs_geo.collect_schema().names() == lf.collect_schema().names()
+
+
+def test_split_geos_returns_empty_frame_when_all_have_coordinates():
+    lf = pl.LazyFrame({"geocode_x": ["1", "2"], "geocode_y": ["3", "4"]})
+
+    has_geo, needs_geo = split_geos(lf, {"srid_2272": True})
+
+    assert has_geo.collect().height == 2
+    assert needs_geo.collect().height == 0
+    assert needs_geo.collect_schema().names() == ["geocode_x", "geocode_y"]
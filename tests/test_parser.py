@@ -1,14 +1,22 @@
 import pytest
 import yaml
+import polars as pl
+import usaddress
 from passyunk.parser import PassyunkParser
 from functools import partial
-from utils.zips import ZIPS
+from utils.zips import ZIPS, ZIPS_SERIES
 from utils.parse_address import (
     parse_address,
+    parse_addresses,
     combine_fields,
     find_address_fields,
     flag_non_philly_address,
+    flag_non_philly_expr,
     tag_full_address,
+    tag_full_addresses,
+    tag_full_addresses_expr,
+    load_parse_cache,
+    save_parse_cache,
 )
 
 p = PassyunkParser()
@@ -64,6 +72,27 @@ def test_parse_real_address():
     assert is_philly_addr
 
 
+def test_parse_addresses_parses_series():
+    addresses = pl.Series("address", ["123 mkt", None, "123 mkt", "not an address"])
+
+    result = parse_addresses(p, addresses).to_list()
+
+    assert result == [parse("123 mkt"), None, parse("123 mkt"), parse("not an address")]
+
+
+def test_parse_addresses_reuses_cache_between_batches():
+    cache = {}
+    parse_addresses(p, pl.Series("address", ["123 mkt"]), cache=cache)
+
+    class FailingParser:
+        def parse(self, address):
+            raise AssertionError("address should come from the cache")
+
+    result = parse_addresses(FailingParser(), pl.Series("address", ["123 mkt"]), cache=cache)
+
+    assert result.to_list() == [parse("123 mkt")]
+
+
 def test_flag_non_philly_returns_false():
     address_data = {"city": "Philadelphia", "state": "PA"}
 
@@ -96,6 +125,58 @@ def test_flag_non_philly_returns_true_zip_only():
     assert result == {"is_non_philly": True, "is_undefined": False}
 
 
+def test_flag_non_philly_expr_matches_flag_non_philly_address():
+    records = [
+        {"city": "Philadelphia", "state": "PA", "zip": "80126"},
+        {"city": "Denver", "state": "CO", "zip": None},
+        {"city": None, "state": None, "zip": "19125"},
+        {"city": None, "state": None, "zip": "80126"},
+        {"city": None, "state": "PA", "zip": None},
+    ]
+    df = pl.DataFrame(records, schema={"city": pl.Utf8, "state": pl.Utf8, "zip": pl.Utf8})
+
+    result = df.select(
+        flag_non_philly_expr(pl.col("city"), pl.col("state"), pl.col("zip"), ZIPS_SERIES)
+    ).to_dicts()
+
+    assert result == [flag_non_philly_address(record, zips) for record in records]
+
+
+def test_tag_full_address_returns_a_new_dict_each_call():
+    address = "1234 Market St, Philadelphia, PA 19107"
+
+    tagged = tag_full_address(address)
+    tagged["city"] = None
+
+    assert tag_full_address(address) == {
+        "city": "Philadelphia",
+        "state": "PA",
+        "zip": "19107",
+    }
+
+
+def test_tag_full_addresses_expr_matches_tag_full_addresses():
+    addresses = pl.Series(
+        "address",
+        [
+            "1234 Market St, Philadelphia, PA 19107",
+            "1234 Market Street Philadelphia PA 19107",
+            "100 Main St, Camden, NJ 08102",
+            "1 Main St, Upper Darby, Phila, PA 19082",
+            "1 Main St, Upper Darby, Philadelphia, PA 19107",
+            "1 N Broad St, Unit 2, Philadelphia, PA 19107",
+            None,
+            "not an address",
+        ],
+    )
+
+    result = pl.DataFrame(addresses).select(
+        tag_full_addresses_expr(pl.col("address")).alias("tagged")
+    )
+
+    assert result["tagged"].to_list() == tag_full_addresses(addresses).to_list()
+
+
 def test_parse_non_philly_address():
     parsed = parse("123 fake st")
 
@@ -147,3 +228,43 @@ def test_tag_full_address_tags_correctly():
     expected = {"city": "Philadelphia", "state": "PA", "zip": "19107"}
 
     assert expected == tagged
+
+
+def test_tag_full_address_fast_path_matches_usaddress():
+    addresses = [
+        "1234 Market St, Philadelphia, PA 19107",
+        "1234 Market St, Philadelphia, Pennsylvania, 19107",
+        "1234 Market St Apt 5, Phila, PA 19107-1234",
+        "1 N Broad St, Unit 2, philadelphia, pa, 19107",
+        "1 Main St, Upper Darby, Phila, PA 19082",
+        "1 Main St, Upper Darby, Philadelphia, PA 19107",
+    ]
+
+    for address in addresses:
+        tagged, _ = usaddress.tag(address)
+        expected = {
+            "city": tagged.get("PlaceName"),
+            "state": tagged.get("StateName"),
+            "zip": tagged.get("ZipCode"),
+        }
+
+        assert tag_full_address(address) == expected
+
+
+def test_parse_cache_round_trips(tmp_path):
+    cache_path = str(tmp_path / "parse_cache.parquet")
+    cache = {"1234 MARKET ST": parse("1234 Market St")}
+
+    save_parse_cache(cache, cache_path, "1.0")
+
+    assert load_parse_cache(cache_path, "1.0") == cache
+
+
+def test_parse_cache_ignores_other_passyunk_versions(tmp_path):
+    cache_path = str(tmp_path / "parse_cache.parquet")
+    cache = {"1234 MARKET ST": parse("1234 Market St")}
+
+    save_parse_cache(cache, cache_path, "1.0")
+
+    assert load_parse_cache(cache_path, "2.0") == {}
+    assert load_parse_cache(str(tmp_path / "missing.parquet"), "1.0") == {}
@@ -0,0 +1,61 @@
+import threading
+import time
+from utils.rate_limiter import MAX_RETRY_AFTER, RateLimiter
+
+
+def test_rate_limiter_allows_max_calls_per_period():
+    limiter = RateLimiter(max_calls=3, period=0.1)
+    lock = threading.Lock()
+    starts = []
+
+    def call():
+        limiter.wait()
+        with lock:
+            starts.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    starts.sort()
+
+    # The first max_calls go out at once, then no window of one period
+    # holds more than max_calls
+    assert starts[2] - starts[0] < 0.05
+    assert all(
+        later - earlier >= 0.1 - 0.005
+        for earlier, later in zip(starts, starts[3:])
+    )
+
+
+def test_rate_limiter_pause_holds_back_all_calls():
+    limiter = RateLimiter(max_calls=10, period=1.0)
+
+    limiter.pause(0.1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=limiter.wait) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - start >= 0.1 - 0.005
+
+
+def test_pause_for_retry_after_honors_header(monkeypatch):
+    limiter = RateLimiter(max_calls=1)
+    paused = []
+    monkeypatch.setattr(limiter, "pause", paused.append)
+
+    class FakeResponse:
+        def __init__(self, headers):
+            self.headers = headers
+
+    limiter.pause_for_retry_after(FakeResponse({"Retry-After": "2"}))
+    limiter.pause_for_retry_after(FakeResponse({"Retry-After": "3600"}))
+    limiter.pause_for_retry_after(FakeResponse({"Retry-After": "not a date"}))
+    limiter.pause_for_retry_after(FakeResponse({}))
+
+    assert paused == [2.0, MAX_RETRY_AFTER]
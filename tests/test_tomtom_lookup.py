@@ -1,5 +1,9 @@
+import pytest
+import polars as pl
 import utils.tomtom_lookup as tomtom_lookup
 from passyunk.parser import PassyunkParser
+from geocoder import lookup_distinct
+from utils.lookup_cache import LookupCache
 
 p = PassyunkParser()
 
@@ -276,4 +280,72 @@ def test_tomtom_lookup_handles_non_philly_address(monkeypatch):
     assert result["geocode_lat"] == "39.88775919"
     assert result["geocode_lon"] == "-75.11192847"
     assert result["geocode_x"] == "2700000.0"
-    assert result["geocode_y"] == "240000.0"
\ No newline at end of file
+    assert result["geocode_y"] == "240000.0"
+
+
+@pytest.mark.parametrize(
+    "error_response",
+    [
+        ({}, 401),
+        ({}, 403),
+        ({}, 400),
+        ({"error": {"code": 498, "message": "Invalid Token"}}, 200),
+    ],
+)
+def test_tomtom_lookup_error_response_is_not_cached(
+    monkeypatch, tmp_path, error_response
+):
+    class FakeResponse:
+        def __init__(self, data, status_code=200):
+            self._data = data
+            self.status_code = status_code
+
+        def json(self):
+            return self._data
+
+    class FakeSession:
+        def get(self, *a, **k):
+            raise AssertionError("Should be patched")
+
+    responses = {"current": error_response}
+
+    def fake_get(self, url, params=None, timeout=None, **kwargs):
+        return FakeResponse(*responses["current"])
+
+    monkeypatch.setattr(FakeSession, "get", fake_get)
+    sess = FakeSession()
+
+    def lookup_fn(row):
+        # Skip the retry decorator's backoff
+        return tomtom_lookup.tomtom_lookup.__wrapped__(
+            sess,
+            p,
+            ["19107"],
+            row["address"],
+            row["address"],
+            fetch_4326=True,
+            fetch_2272=False,
+        )
+
+    lf = pl.LazyFrame({"address": ["1234 Market St"]})
+    return_dtype = pl.Struct(
+        [
+            pl.Field("output_address", pl.String),
+            pl.Field("is_addr", pl.Boolean),
+            pl.Field("geocode_lat", pl.String),
+            pl.Field("geocode_lon", pl.String),
+        ]
+    )
+    cache = LookupCache(str(tmp_path / "lookups.db"))
+
+    with pytest.raises(ValueError):
+        lookup_distinct(lf, ["address"], lookup_fn, return_dtype, "tomtom", cache=cache)
+
+    # Once the problem is fixed, the address is looked up again
+    responses["current"] = (json_response_match, 200)
+    result = lookup_distinct(
+        lf, ["address"], lookup_fn, return_dtype, "tomtom", cache=cache
+    ).collect()
+    cache.close()
+
+    assert result["tomtom"].struct.field("is_addr").to_list() == [True]
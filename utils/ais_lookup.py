@@ -1,6 +1,7 @@
 import requests
 from retrying import retry
 from .rate_limiter import RateLimiter
+from .projection import to_2272
 from urllib.parse import quote
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
@@ -9,6 +10,10 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
 AIS_RATE_LIMITER = RateLimiter(max_calls=5, period=1.0)
 
+# Number of addresses to look up at once. Requests still go through
+# AIS_RATE_LIMITER, so this only overlaps time spent waiting on responses.
+AIS_MAX_WORKERS = 5
+
 
 def tiebreak(response: dict, zip) -> dict:
     """
@@ -17,7 +22,7 @@ def tiebreak(response: dict, zip) -> dict:
     duplicate match.
 
     Args:
-        response (dict): An AIS API response
+        response (dict): A parsed AIS API response
         zip (str): The zip code present on the input data. Used
         to check API responses against.
 
@@ -25,22 +30,21 @@ def tiebreak(response: dict, zip) -> dict:
         A dict with the zipcode-matched record, or if no match, None.
     """
 
-    candidates = []
-    for candidate in response.json()["features"]:
+    match = None
+    for candidate in response["features"]:
         # If the AIS API zip code matches the zip code on the
         # incoming data, this record is a potential match
         if candidate["properties"].get("zip_code", "") == zip:
-            candidates.append(candidate)
+            # Sometimes AIS returns two addresses for the same lat lon
+            # should write code in the future to more intelligently tiebreak
+            # and behaves differently based on if the two addresses returned
+            # are actually the same
+            if match is not None:
+                return None
 
-    # Sometimes AIS returns two addresses for the same lat lon
-    # should write code in the future to more intelligently tiebreak
-    # and behaves differently based on if the two addresses returned
-    # are actually the same
-    if len(candidates) == 1:
-        return candidates[0]
+            match = candidate
 
-    else:
-        return None
+    return match
 
 
 def get_intersection_coords(ais_dict: dict) -> list[str, str]:
@@ -65,6 +69,7 @@ def get_intersection_coords(ais_dict: dict) -> list[str, str]:
     wait_exponential_multiplier=1000,
     wait_exponential_max=10000,
     stop_max_attempt_number=5,
+    wait_jitter_max=1000,
 )
 def make_coordinate_lookups(
     sess: requests.Session,
@@ -74,9 +79,11 @@ def make_coordinate_lookups(
     """Given a list of coordinate pairs, do a reverse lookup
     against the AIS API. Returns a list of matches for each
     coordinate pair in the list."""
-    out_data = []
+    out_data = {}
 
-    for coord in coords:
+    # Intersection features often share coordinates, so each distinct
+    # pair is only looked up once
+    for coord in dict.fromkeys(coords):
         AIS_RATE_LIMITER.wait()
         lon, lat = coord
         ais_url = f"https://api.phila.gov/ais_doc/v1/reverse_geocode/{lon},{lat}"
@@ -89,20 +96,21 @@ def make_coordinate_lookups(
             raise Exception("5xx response. There may be a problem with the AIS API.")
         elif response.status_code == 429:
             print(response.text)
+            AIS_RATE_LIMITER.pause_for_retry_after(response)
             raise Exception("429 response. Too many calls to the AIS API.")
 
         elif response.status_code == 401:
             raise Exception("401 response. Invalid API key.")
 
         elif response.status_code == 200:
-            out_data.append(response.json())
+            out_data[coord] = response.json()
 
         else:
             raise ValueError(
                 f"Error occurred with the following status code: {response.status_code}"
             )
 
-    return out_data
+    return [out_data[coord] for coord in coords]
 
 
 def tiebreak_coordinate_lookups(responses: list[dict], zip: str):
@@ -145,12 +153,19 @@ def _fetch_ais_coordinates(
     AIS_RATE_LIMITER.wait()
     ais_url = f"https://api.phila.gov/ais/v1/search/{quote(address)}?gatekeeperKey={api_key}&srid={srid}&max_range=0"
 
-    response = sess.get(ais_url, verify=False)
+    response = sess.get(ais_url, timeout=10, verify=False)
 
     if response.status_code >= 500:
         raise Exception("5xx response. There may be a problem with the AIS API.")
     elif response.status_code == 429:
+        AIS_RATE_LIMITER.pause_for_retry_after(response)
         raise Exception("429 response. Too many calls to the AIS API.")
+    elif response.status_code == 401:
+        raise Exception("401 response. Invalid API key.")
+    elif response.status_code not in (200, 404):
+        raise ValueError(
+            f"Error occurred with the following status code: {response.status_code}"
+        )
     elif response.status_code == 200:
         r_json = response.json()
 
@@ -159,7 +174,7 @@ def _fetch_ais_coordinates(
 
             # Tiebreak if multiple results
             if len(r_json["features"]) > 1:
-                feature = tiebreak(response, zip)
+                feature = tiebreak(r_json, zip)
                 if not feature:
                     return None, None
                 
@@ -178,6 +193,7 @@ def _fetch_ais_coordinates(
     wait_exponential_max=10000,
     stop_max_attempt_number=3,
     wait_fixed=200,
+    wait_jitter_max=1000,
 )
 def ais_lookup(
     sess: requests.Session,
@@ -190,6 +206,7 @@ def ais_lookup(
     original_address: str = None,
     fetch_4326: bool = True,
     fetch_2272: bool = True,
+    derive_2272: bool = False,
 ) -> dict:
     """
     Given a passyunk-normalized address, looks up whether or not it is in the
@@ -203,6 +220,8 @@ def ais_lookup(
         enrichment_fields (list): The fields to add from AIS
         fetch_4326 (bool): Whether to fetch SRID 4326 coordinates (lat/lon)
         fetch_2272 (bool): Whether to fetch SRID 2272 coordinates (x/y)
+        derive_2272 (bool): Whether to project the 4326 coordinates to 2272
+        locally instead of making a second request for them
 
     Returns:
         A dict with standardized address, latitude and longitude,
@@ -210,40 +229,49 @@ def ais_lookup(
     """
     AIS_RATE_LIMITER.wait()
     ais_url = "https://api.phila.gov/ais/v1/search/" + quote(address) + f"?gatekeeperKey={api_key}&srid=4326&max_range=0" 
-    response = sess.get(ais_url, verify=False)
+    response = sess.get(ais_url, timeout=10, verify=False)
 
     if response.status_code >= 500:
         raise Exception("5xx response. There may be a problem with the AIS API.")
     elif response.status_code == 429:
         print(response.text)
+        AIS_RATE_LIMITER.pause_for_retry_after(response)
         raise Exception("429 response. Too many calls to the AIS API.")
+    elif response.status_code == 401:
+        raise Exception("401 response. Invalid API key.")
+    elif response.status_code not in (200, 404):
+        raise ValueError(
+            f"Error occurred with the following status code: {response.status_code}"
+        )
 
     out_data = {}
     # If status code is 200, that means API has found a match.
-    # API will return a 404 if no match
+    # API will return a 404 if no match. Every other status raises above,
+    # so an error is never saved to the lookup cache as a non-match.
     if response.status_code == 200:
         # If r_json is longer than 1, multiple matches
         # were returned and we need to tiebreak
         r_json = response.json()
+        features = r_json.get("features") or []
+        search_type = r_json.get("search_type")
         tiebroken_address = None
 
-        if len(r_json["features"]) > 1 and r_json.get("search_type") == "address":
-            tiebroken_address = tiebreak(response, zip)
+        if len(features) > 1 and search_type == "address":
+            tiebroken_address = tiebreak(r_json, zip)
 
-        elif r_json.get("search_type") == "intersection":
-            coord_pairs = get_intersection_coords(response.json())
+        elif search_type == "intersection":
+            coord_pairs = get_intersection_coords(r_json)
             coord_lookup_results = make_coordinate_lookups(sess, coord_pairs, api_key)
             tiebroken_address = tiebreak_coordinate_lookups(coord_lookup_results, zip)
 
         # if r_json is not longer than 1, no need to tiebreak
-        elif len(r_json["features"]) == 1:
-            tiebroken_address = response.json()["features"][0]
+        elif len(features) == 1:
+            tiebroken_address = features[0]
 
         # If tiebreak fails, return
         # null values for most fields.
         if not tiebroken_address:
-            tiebroken_address = response.json()
-            normalized_addr = tiebroken_address.get("normalized", "")
+            normalized_addr = r_json.get("normalized", "")
             out_data["output_address"] = normalized_addr if normalized_addr else address
             out_data["is_addr"] = False
             out_data["is_philly_addr"] = True
@@ -258,8 +286,7 @@ def ais_lookup(
                 out_data["geocode_x"] = None
                 out_data["geocode_y"] = None
 
-            for field in enrichment_fields:
-                out_data[field] = None
+            out_data.update(dict.fromkeys(enrichment_fields))
 
             return out_data
 
@@ -275,18 +302,24 @@ def ais_lookup(
             out_data["is_multiple_match"] = False
             out_data["geocoder_used"] = "ais"
 
-        # Fetch coordinates based on config
+            # The first lookup was made in 4326, so those coords are
+            # already here
+            try:
+                lon, lat = tiebroken_address["geometry"]["coordinates"]
+            except (KeyError, TypeError, ValueError):
+                lon, lat = None, None
+
+            # Fetch coordinates based on config
             if fetch_4326:
-                try:
-                    # Don't need to make another lookup, we already have
-                    # coords from first lookup
-                    lon, lat = tiebroken_address["geometry"]["coordinates"]
-                except (KeyError, TypeError, ValueError):
-                    lon, lat = None, None
                 out_data["geocode_lat"] = _round_coordinates(lat)
                 out_data["geocode_lon"] = _round_coordinates(lon)
 
-            if fetch_2272:
+            if fetch_2272 and derive_2272:
+                geo_x, geo_y = to_2272(lon, lat)
+                out_data["geocode_x"] = _round_coordinates(geo_x)
+                out_data["geocode_y"] = _round_coordinates(geo_y)
+
+            elif fetch_2272:
                 geo_x, geo_y = _fetch_ais_coordinates(sess, api_key, out_address, zip, 2272)
                 out_data["geocode_x"] = _round_coordinates(geo_x)
                 out_data["geocode_y"] = _round_coordinates(geo_y)
@@ -313,7 +346,6 @@ def ais_lookup(
         out_data["geocode_x"] = None
         out_data["geocode_y"] = None
 
-    for field in enrichment_fields:
-        out_data[field] = None
+    out_data.update(dict.fromkeys(enrichment_fields))
 
     return out_data
@@ -1,12 +1,39 @@
 import chardet
+import codecs
+import shutil
 from pathlib import Path
 
+# chardet only needs a sample of the file to detect its encoding
+DETECT_SAMPLE_BYTES = 64 * 1024
+
+# Size of the blocks the input file is transcoded and validated in
+RECODE_BLOCK_CHARS = 1 << 20
+
 
 def detect_file_encoding(file_path: str):
     # Attempt to determine the filetype
-    # by reading the first 10kb of a file
+    # by reading the first 64kb of a file
     with open(file_path, "rb") as f:
-        raw_data = f.read(100000)
+        raw_data = f.read(DETECT_SAMPLE_BYTES)
+
+    # Most input files are UTF-8 or plain ASCII, which can be recognized
+    # without running chardet over the whole sample
+    if raw_data.startswith(codecs.BOM_UTF8):
+        return "UTF-8-SIG"
+
+    if raw_data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "UTF-16"
+
+    if raw_data.isascii():
+        return "ascii"
+
+    try:
+        # An incremental decoder doesn't fail on a character that was cut
+        # off at the end of the sample
+        codecs.getincrementaldecoder("utf-8")().decode(raw_data)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
 
     result = chardet.detect(raw_data)
     encoding = result["encoding"]
@@ -14,9 +41,49 @@ def detect_file_encoding(file_path: str):
     return encoding
 
 
+def needs_recode(file_path: str, encoding: str) -> bool:
+    """
+    Whether a file in the given encoding has to be recoded before polars
+    can read it. ASCII files are already valid UTF-8. chardet reports
+    UTF-8 as "utf-8", so the name is normalized before comparing.
+
+    The encoding is only detected from the start of the file, so a file
+    detected as ASCII or UTF-8 is checked to be valid UTF-8 throughout
+    before the recode is skipped.
+    """
+    try:
+        name = codecs.lookup(encoding).name
+    except (TypeError, LookupError):
+        return True
+
+    if name not in ("ascii", "utf-8"):
+        return True
+
+    return not _is_utf8(file_path)
+
+
+def _is_utf8(file_path: str) -> bool:
+    """
+    Whether a whole file decodes as UTF-8, read in blocks so that it is
+    never held in memory.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    try:
+        with open(file_path, "rb") as f:
+            while block := f.read(RECODE_BLOCK_CHARS):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+
+    return True
+
+
 def recode_to_utf8(src_path: str, dst_path: str, src_encoding: str) -> Path:
     """
-    Reincode an input file to account for non-standard characters, line by line.
+    Reincode an input file to account for non-standard characters, in
+    blocks so that the whole file is never held in memory.
     """
 
     src = Path(src_path)
@@ -30,5 +97,4 @@ def recode_to_utf8(src_path: str, dst_path: str, src_encoding: str) -> Path:
         src.open("r", encoding=src_encoding, errors="strict", newline="") as fin,
         dst.open("w", encoding="utf-8", newline="") as fout,
     ):
-        for line in fin:
-            fout.write(line)
+        shutil.copyfileobj(fin, fout, RECODE_BLOCK_CHARS)
@@ -0,0 +1,71 @@
+import json
+import sqlite3
+import time
+
+# Cached lookups older than this are looked up again, so changes to AIS
+# and TomTom data eventually make it into the output
+MAX_AGE_DAYS = 30
+
+
+class LookupCache:
+    """
+    On-disk cache of AIS and TomTom lookup results, so that repeat runs
+    over the same addresses don't make the same API calls again. Results
+    are keyed by the lookup name, the fields it returns, any options that
+    change its results and the values it was called with, so changing the
+    enrichment fields, SRIDs or derive_2272_locally in the config doesn't
+    reuse results of a different shape or source.
+
+    Only used from the thread that runs lookup_distinct, not from the
+    lookup threads themselves.
+    """
+
+    def __init__(self, path: str, max_age_days: int = MAX_AGE_DAYS) -> None:
+        self._conn = sqlite3.connect(path)
+        self._max_age = max_age_days * 24 * 60 * 60
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lookups "
+            "(key TEXT PRIMARY KEY, payload TEXT NOT NULL, ts INTEGER NOT NULL)"
+        )
+
+    @staticmethod
+    def make_key(name: str, fields: list, values: list, options: dict = None) -> str:
+        """
+        Builds the cache key for one lookup.
+        """
+        return json.dumps([name, fields, options or {}, values], sort_keys=True)
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Returns a dict of key to cached result for every key that has a
+        result newer than the max age.
+        """
+        oldest = int(time.time()) - self._max_age
+        found = {}
+
+        # Stay under sqlite's limit on query parameters
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, payload FROM lookups WHERE ts >= ? AND key IN ({placeholders})",
+                [oldest, *batch],
+            )
+            found.update((key, json.loads(payload)) for key, payload in rows)
+
+        return found
+
+    def put_many(self, results: dict) -> None:
+        """
+        Saves a dict of key to lookup result.
+        """
+        now = int(time.time())
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO lookups (key, payload, ts) VALUES (?, ?, ?)",
+                [(key, json.dumps(result), now) for key, result in results.items()],
+            )
+
+    def close(self) -> None:
+        self._conn.close()
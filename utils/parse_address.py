@@ -1,7 +1,45 @@
 import yaml
+import os
 import re
+from functools import lru_cache
 import usaddress
 import sys
+import polars as pl
+
+PHILLY_NAMES = {"philadelphia", "phila", "philly"}
+PA_NAMES = {"pennsylvania", "pa", "penn"}
+
+# Runs of whitespace, collapsed to one space when fields are combined
+WHITESPACE = re.compile(r"\s+")
+
+# A street followed by ", city, state zip", as in "1234 Market St,
+# Philadelphia, PA 19107" or TomTom's "1234 Market St, Philadelphia,
+# Pennsylvania, 19107". The street can't contain a comma, so addresses
+# with any other segment before the city, like "1 Main St, Upper Darby,
+# Phila, PA 19082", don't match and are left to usaddress.
+ADDRESS_TAIL = re.compile(
+    r"^[^,]*,\s*([A-Za-z. ]+?)\s*,\s*([A-Za-z]+)\s*,?\s*(\d{5}(?:-\d{4})?)\s*$"
+)
+
+# Output of tag_full_addresses, one field per address component
+TAGGED_ADDRESS = pl.Struct(
+    [
+        pl.Field("city", pl.String),
+        pl.Field("state", pl.String),
+        pl.Field("zip", pl.String),
+    ]
+)
+
+# Output of parse_addresses, one field per key returned by parse_address
+PARSED_ADDRESS = pl.Struct(
+    [
+        pl.Field("output_address", pl.String),
+        pl.Field("is_addr", pl.Boolean),
+        pl.Field("is_philly_addr", pl.Boolean),
+        pl.Field("is_multiple_match", pl.Boolean),
+        pl.Field("geocoder_used", pl.String),
+    ]
+)
 
 
 def infer_city_state_field(config) -> dict:
@@ -36,21 +74,42 @@ def tag_full_address(address: str):
     Args:
         address (str): The address to tag
     """
+    city, state, zip_code = _tag_full_address(address)
+
+    return {"city": city, "state": state, "zip": zip_code}
+
+
+# Input files and TomTom matches repeat the same addresses across batches.
+# The cached value is a tuple so that callers can't change it for later
+# calls, and tag_full_address builds a new dict from it each time.
+@lru_cache(maxsize=50_000)
+def _tag_full_address(address: str) -> tuple:
+    # Most Philadelphia addresses are a street plus ", Philadelphia, PA 19107",
+    # which can be read without running the usaddress tagger. Anything
+    # else, including other cities and extra comma separated segments,
+    # is still tagged by usaddress.
+    tail = ADDRESS_TAIL.search(address)
+    if (
+        tail
+        and tail[1].lower() in PHILLY_NAMES
+        and tail[2].lower() in PA_NAMES
+    ):
+        return tail[1], tail[2], tail[3]
 
     try:
         tagged, _ = usaddress.tag(address)
 
-        city = tagged.get("PlaceName")
-        state = tagged.get("StateName")
-        zip_code = tagged.get("ZipCode")
-
-        return {"city": city, "state": state, "zip": zip_code}
+        return (
+            tagged.get("PlaceName"),
+            tagged.get("StateName"),
+            tagged.get("ZipCode"),
+        )
 
     except usaddress.RepeatedLabelError:
-        return {"city": None, "state": None, "zip": None}
+        return None, None, None
 
 
-def flag_non_philly_address(address_data: dict, philly_zips: list) -> dict:
+def flag_non_philly_address(address_data: dict, philly_zips: frozenset) -> dict:
     """
     Given a dictionary that contains city, state, zip,
     determine whether or not an address is in Philly.
@@ -58,7 +117,7 @@ def flag_non_philly_address(address_data: dict, philly_zips: list) -> dict:
     Args:
         address_data (dict): A dictionary that may contain any
         combination of city, state, zip.
-        philly_zips (list): A list of all valid Philadelphia zip codes
+        philly_zips (frozenset): A set of all valid Philadelphia zip codes
 
     Returns:
         Dict with 'is_non_philly' (bool) and 'is_undefined' (bool).
@@ -77,19 +136,16 @@ def flag_non_philly_address(address_data: dict, philly_zips: list) -> dict:
     if zip_code:
         zip_code = zip_code.strip()
 
-    philly_names = {"philadelphia", "phila", "philly"}
-    pa_names = {"pennsylvania", "pa", "penn"}
-
     # Case 1: If Philly city and state, treat as Philly regardless
     # of zip:
-    if city in philly_names and state in pa_names:
+    if city in PHILLY_NAMES and state in PA_NAMES:
         return {"is_non_philly": False, "is_undefined": False}  # in Philly
 
     # Case 2: If city is non philly or state is non PA, not in Philly:
-    if city is not None and city not in philly_names:
+    if city is not None and city not in PHILLY_NAMES:
         return {"is_non_philly": True, "is_undefined": False}
 
-    if state is not None and state not in pa_names:
+    if state is not None and state not in PA_NAMES:
         return {"is_non_philly": True, "is_undefined": False}  # non-Philly
 
     # Case 3: Use ZIP when city or state are missing, assume Philly
@@ -105,43 +161,106 @@ def flag_non_philly_address(address_data: dict, philly_zips: list) -> dict:
         return {"is_non_philly": True, "is_undefined": False}
 
 
-def is_non_philly_from_full_address(address: str, *, philly_zips: list) -> dict:
+def flag_non_philly_expr(
+    city: pl.Expr, state: pl.Expr, zip_code: pl.Expr, philly_zips: pl.Series
+) -> list[pl.Expr]:
     """
-    Helper function that allows the flag_non_philly_address
-    to be run as a mapped function within polars.
+    Polars expression equivalent of flag_non_philly_address, so that
+    the check runs over whole columns instead of once per row in python.
 
     Args:
-        address (str)
-        philly_zips (list)
+        city (pl.Expr): A string expression for the city, may be null
+        state (pl.Expr): A string expression for the state, may be null
+        zip_code (pl.Expr): A string expression for the zip, may be null
+        philly_zips (pl.Series): A series of all valid Philadelphia zip codes
 
     Returns:
-        dict: {'is_non_philly': bool, 'is_undefined': bool}
+        A list of two boolean expressions, 'is_non_philly' and 'is_undefined'.
     """
-    if address is None:
-        return {"is_non_philly": False, "is_undefined": True}
+    city = city.str.to_lowercase().str.strip_chars()
+    state = state.str.to_lowercase().str.strip_chars()
+    zip_code = zip_code.str.strip_chars()
+
+    # Case 1: Philly city and state
+    in_philly = (city.is_in(PHILLY_NAMES) & state.is_in(PA_NAMES)).fill_null(False)
+
+    # Case 2: Non philly city or non PA state
+    outside_philly = (
+        (city.is_not_null() & ~city.is_in(PHILLY_NAMES))
+        | (state.is_not_null() & ~state.is_in(PA_NAMES))
+    ).fill_null(False)
+
+    # Case 3: Fall back to ZIP5, null zips are assumed to be in Philly
+    non_philly_zip = (
+        zip_code.is_not_null()
+        & ~zip_code.str.slice(0, 5).is_in(philly_zips.implode())
+    ).fill_null(False)
+
+    return [
+        (~in_philly & (outside_philly | non_philly_zip)).alias("is_non_philly"),
+        (~in_philly & ~outside_philly & zip_code.is_null()).alias("is_undefined"),
+    ]
 
-    address_data = tag_full_address(address)
 
-    return flag_non_philly_address(address_data, philly_zips)
+def tag_full_addresses(addresses: pl.Series) -> pl.Series:
+    """
+    Tags a polars Series of full addresses with tag_full_address. Meant
+    to be used with map_batches, so each distinct address in a batch
+    is only tagged once.
+
+    Args:
+        addresses (pl.Series): A series of address strings
+
+    Returns:
+        A series of TAGGED_ADDRESS structs. Null addresses are left null.
+    """
+    tagged = {
+        address: tag_full_address(address)
+        for address in addresses.drop_nulls().unique()
+    }
+
+    return pl.Series(
+        addresses.name,
+        [tagged.get(address) for address in addresses],
+        dtype=TAGGED_ADDRESS,
+    )
 
 
-def is_non_philly_from_split_address(
-    address_data: dict,
-    *,
-    zips: list,
-) -> bool:
+def tag_full_addresses_expr(address: pl.Expr) -> pl.Expr:
     """
-    Address_data: A row from a polars struct with keys
-    'city', 'state', 'zip'.
+    Polars expression equivalent of tag_full_addresses. Addresses ending
+    in a plain Philadelphia tail are read with a regex over the whole
+    column, and only the rest are sent to usaddress in python.
 
-    Zips are frozen with partial.
+    Args:
+        address (pl.Expr): A string expression for the full address
 
-    Returns dict with is_non_philly and is_undefined flags.
+    Returns:
+        A TAGGED_ADDRESS struct expression. Null addresses are left null.
     """
-    if address_data is None:
-        return {"is_non_philly": False, "is_undefined": True}
+    tail = address.str.extract_groups(ADDRESS_TAIL.pattern).struct
+    city, state, zip_code = tail.field("1"), tail.field("2"), tail.field("3")
+
+    is_philly_tail = (
+        city.str.to_lowercase().is_in(PHILLY_NAMES)
+        & state.str.to_lowercase().is_in(PA_NAMES)
+    ).fill_null(False)
+
+    # Null out the addresses already read from their tail, so that
+    # tag_full_addresses skips them
+    tagged = (
+        pl.when(~is_philly_tail)
+        .then(address)
+        .map_batches(
+            tag_full_addresses, return_dtype=TAGGED_ADDRESS, is_elementwise=True
+        )
+    )
 
-    return flag_non_philly_address(address_data, zips)
+    return (
+        pl.when(is_philly_tail)
+        .then(pl.struct(city.alias("city"), state.alias("state"), zip_code.alias("zip")))
+        .otherwise(tagged)
+    )
 
 
 def find_address_fields(config) -> dict[str]:
@@ -216,7 +335,7 @@ def combine_fields(fields: list, record: dict):
     joined = " ".join(record[field] for field in fields)
 
     # Strip residual spaces left from blank fields
-    return re.sub(r"\s+", " ", joined)
+    return WHITESPACE.sub(" ", joined)
 
 
 def parse_address(parser, address: str) -> tuple[str, bool, bool]:
@@ -261,3 +380,79 @@ def parse_address(parser, address: str) -> tuple[str, bool, bool]:
         "is_multiple_match": False,
         "geocoder_used": None,
     }
+
+
+def parse_addresses(
+    parser, addresses: pl.Series, cache: dict = None
+) -> pl.Series:
+    """
+    Parses a polars Series of addresses with parse_address. Meant to be
+    used with map_batches, so each distinct address in a batch is only
+    parsed once.
+
+    Args:
+        parser: A PassyunkParser object
+        addresses (pl.Series): A series of address strings
+        cache (dict): Optional dict of address to parse_address output.
+        Shared across batches so an address is only parsed once per run,
+        even when polars evaluates the same plan more than once.
+
+    Returns:
+        A series of PARSED_ADDRESS structs. Null addresses are left null.
+    """
+    if cache is None:
+        cache = {}
+
+    for address in addresses.drop_nulls().unique():
+        if address not in cache:
+            cache[address] = parse_address(parser, address)
+
+    return pl.Series(
+        addresses.name,
+        [cache.get(address) for address in addresses],
+        dtype=PARSED_ADDRESS,
+    )
+
+
+def load_parse_cache(path: str, parser_version: str) -> dict:
+    """
+    Loads parse_address results saved by save_parse_cache, for use as
+    the cache in parse_addresses. Results saved by a different version of
+    passyunk are ignored, as it may parse addresses differently.
+
+    Args:
+        path (str): The path to the cache file, may be None
+        parser_version (str): The installed passyunk version
+
+    Returns:
+        A dict of address to parse_address output. Empty if there is
+        no cache file yet.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+
+    cached = pl.read_parquet(path).filter(
+        pl.col("passyunk_version") == parser_version
+    )
+
+    return dict(zip(cached["address"], cached["parsed"]))
+
+
+def save_parse_cache(cache: dict, path: str, parser_version: str):
+    """
+    Saves parse_address results to a parquet file so that later runs
+    don't have to parse the same addresses again.
+
+    Args:
+        cache (dict): A dict of address to parse_address output
+        path (str): The path to write the cache file to
+        parser_version (str): The installed passyunk version
+    """
+    pl.DataFrame(
+        {
+            "address": pl.Series(list(cache.keys()), dtype=pl.String),
+            "parsed": pl.Series(list(cache.values()), dtype=PARSED_ADDRESS),
+        }
+    ).with_columns(pl.lit(parser_version).alias("passyunk_version")).write_parquet(
+        path, compression="zstd"
+    )
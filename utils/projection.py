@@ -0,0 +1,60 @@
+import math
+
+# EPSG:2272, NAD83 / Pennsylvania South (US survey feet). A Lambert
+# conformal conic projection on the GRS80 ellipsoid. WGS84 and NAD83 are
+# treated as the same datum, which is what PROJ does by default for
+# 4326 -> 2272 and is well under a meter off in Philadelphia.
+_A = 6378137.0
+_F = 1 / 298.257222101
+_E = math.sqrt(2 * _F - _F**2)
+
+_LAT_1 = math.radians(40 + 58 / 60)
+_LAT_2 = math.radians(39 + 56 / 60)
+_LAT_0 = math.radians(39 + 20 / 60)
+_LON_0 = math.radians(-77.75)
+_FALSE_EASTING = 600000.0
+
+_FEET_PER_METER = 3937 / 1200
+
+
+def _m(lat: float) -> float:
+    return math.cos(lat) / math.sqrt(1 - (_E * math.sin(lat)) ** 2)
+
+
+def _t(lat: float) -> float:
+    e_sin = _E * math.sin(lat)
+    return math.tan(math.pi / 4 - lat / 2) / ((1 - e_sin) / (1 + e_sin)) ** (_E / 2)
+
+
+_N = (math.log(_m(_LAT_1)) - math.log(_m(_LAT_2))) / (
+    math.log(_t(_LAT_1)) - math.log(_t(_LAT_2))
+)
+_AF = _A * _m(_LAT_1) / (_N * _t(_LAT_1) ** _N)
+_RHO_0 = _AF * _t(_LAT_0) ** _N
+
+
+def to_2272(lon, lat) -> tuple[float, float]:
+    """
+    Projects a longitude and latitude in SRID 4326 to an x and y in
+    SRID 2272, so the 2272 coordinates don't need a second API call.
+
+    Args:
+        lon: The longitude, in degrees
+        lat: The latitude, in degrees
+
+    Returns:
+        A tuple of (x, y) in feet, or (None, None) if either coordinate
+        is missing or not a number.
+    """
+    try:
+        lon, lat = float(lon), float(lat)
+    except (TypeError, ValueError):
+        return None, None
+
+    rho = _AF * _t(math.radians(lat)) ** _N
+    theta = _N * (math.radians(lon) - _LON_0)
+
+    x = _FALSE_EASTING + rho * math.sin(theta)
+    y = _RHO_0 - rho * math.cos(theta)
+
+    return x * _FEET_PER_METER, y * _FEET_PER_METER
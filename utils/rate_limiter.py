@@ -1,44 +1,89 @@
 from collections import deque
+from email.utils import parsedate_to_datetime
 import threading
 import time
 
+# Longest Retry-After pause to honor before retrying a 429 response
+MAX_RETRY_AFTER = 60
+
 
 class RateLimiter:
     """
-    Thread-safe rate limiter. Polars is multithreaded by default,
-    so rate limitation needs to take this into account when making calls
-    against APIs.
+    Thread-safe rate limiter. API lookups run from a thread pool
+    and polars is multithreaded by default, so rate limitation is
+    enforced here, around each HTTP call, rather than by limiting threads.
+
+    Allows at most max_calls in any window of period seconds. Each call
+    reserves the earliest start time that keeps to that limit and sleeps
+    until then, so waiting threads never poll and go in the order they
+    arrived.
+
+    A 429 response can pause the limiter until the server's Retry-After
+    time, which holds back every thread sharing it, not only the one that
+    got the response.
     """
 
     def __init__(self, max_calls: int, period: float = 1.0) -> None:
         self.max_calls = max_calls
         self.period = period
         self._lock = threading.Lock()
-        self._calls = deque()
+
+        # Start times of the last max_calls calls, including calls
+        # that are still sleeping until their reserved time
+        self._calls = deque(maxlen=max_calls)
+
+        # No call starts before this time, set by pause()
+        self._paused_until = 0.0
 
     def wait(self) -> None:
         """
         Block until another call can be made.
         """
 
-        while True:
-            with self._lock:
-                now = time.monotonic()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._paused_until)
+
+            # A call can't start until a period after the call max_calls
+            # before it
+            if len(self._calls) == self.max_calls:
+                start = max(start, self._calls[0] + self.period)
+
+            self._calls.append(start)
 
-                # If first call is before the window, we can drop it
-                while self._calls and self._calls[0] <= now - self.period:
-                    self._calls.popleft()
+        sleep_for = start - now
+        if sleep_for > 0:
+            time.sleep(sleep_for)
 
-                # We can make a call if there are fewer
-                # than max calls in the queue
-                if len(self._calls) < self.max_calls:
-                    self._calls.append(now)
-                    return
+    def pause(self, seconds: float) -> None:
+        """
+        Hold back all calls for the next given number of seconds, on top
+        of the usual rate limit.
+        """
+
+        with self._lock:
+            self._paused_until = max(
+                self._paused_until, time.monotonic() + seconds
+            )
+
+    def pause_for_retry_after(self, response) -> None:
+        """
+        On a 429 response, pause for as long as the server's Retry-After
+        header asks, capped at MAX_RETRY_AFTER, so the retried lookup and
+        every other lookup using this limiter wait it out. Supports both
+        the seconds and the HTTP date form of the header.
+        """
+        retry_after = response.headers.get("Retry-After")
+        if not retry_after:
+            return
 
-                oldest = self._calls[0]
-                sleep_for = self.period - (now - oldest)
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return
 
-            if sleep_for > 0:
-                time.sleep(sleep_for)
-            else:
-                time.sleep(0.001)
+        if delay > 0:
+            self.pause(min(delay, MAX_RETRY_AFTER))
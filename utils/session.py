@@ -0,0 +1,23 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def build_session(pool_size: int = 10) -> requests.Session:
+    """
+    Builds the requests session shared by every AIS and TomTom lookup in
+    a run, so connections (and their TLS handshakes) are reused across
+    lookups instead of being reopened for each enrichment step.
+
+    Args:
+        pool_size (int): How many connections to keep open per host. Should
+        be at least the number of lookups that run at once.
+
+    Returns:
+        A requests Session object.
+    """
+    sess = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+
+    return sess
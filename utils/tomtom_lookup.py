@@ -1,11 +1,64 @@
 import requests
+import threading
+from functools import lru_cache
 from .rate_limiter import RateLimiter
 from retrying import retry
 from .parse_address import tag_full_address, flag_non_philly_address
 from .ais_lookup import _round_coordinates
+from .projection import to_2272
+
+TOMTOM_URL = "https://citygeo-geocoder-aws.phila.city/arcgis/rest/services/TomTom/US_StreetAddress/GeocodeServer/findAddressCandidates"
+
+# Sent with every TomTom request. Only the best candidate is used.
+TOMTOM_PARAMS = {"f": "json", "maxLocations": 1}
 
 TOMTOM_RATE_LIMITER = RateLimiter(max_calls=10, period=1.0)
 
+# Number of addresses to look up at once. Requests still go through
+# TOMTOM_RATE_LIMITER, so this only overlaps time spent waiting on responses.
+TOMTOM_MAX_WORKERS = 5
+
+# usaddress tags with a single module-level CRF tagger, so matched
+# addresses are tagged and parsed one at a time. This is CPU-bound work
+# that holds the GIL anyway.
+_PARSE_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=100_000)
+def _parse_matched_address(parser, matched_address: str) -> str:
+    """
+    Normalizes a TomTom matched address with passyunk. Different input
+    addresses often match the same TomTom address, so results are cached.
+    """
+    return parser.parse(matched_address).get("components", "").get("output_address", "")
+
+
+def _tomtom_candidates(response: requests.Response) -> list:
+    """
+    Returns the candidates from a TomTom response, or an empty list if
+    there was no match. Raises on any error, including an error that
+    comes back in the body of a 200 response, so that it is retried and
+    never saved to the lookup cache as a non-match.
+    """
+    if response.status_code >= 500:
+        raise Exception("5xx response. There may be a problem with TomTom API server.")
+    elif response.status_code == 429:
+        TOMTOM_RATE_LIMITER.pause_for_retry_after(response)
+        raise Exception("429 response. Too many API calls to TomTom.")
+    elif response.status_code == 404:
+        return []
+    elif response.status_code != 200:
+        raise ValueError(
+            f"Error occurred with the following status code: {response.status_code}"
+        )
+
+    r_json = response.json()
+    if "error" in r_json:
+        raise ValueError(f"TomTom returned an error: {r_json['error']}")
+
+    return r_json.get("candidates") or []
+
+
 def _fetch_tomtom_coordinates(
     sess: requests.Session,
     address: str,
@@ -16,18 +69,14 @@ def _fetch_tomtom_coordinates(
     Returns (coord1, coord2) or (None, None) if failed.
     """
     TOMTOM_RATE_LIMITER.wait()
-    tomtom_url = "https://citygeo-geocoder-aws.phila.city/arcgis/rest/services/TomTom/US_StreetAddress/GeocodeServer/findAddressCandidates"
-    params = {"Address": address, "f": "pjson", "outSR": str(srid)}
+    params = {**TOMTOM_PARAMS, "Address": address, "outSR": str(srid)}
     
-    response = sess.get(tomtom_url, params=params, timeout=10)
+    response = sess.get(TOMTOM_URL, params=params, timeout=10)
     
-    if response.status_code >= 500:
-        raise Exception("5xx response. There may be a problem with TomTom API server.")
-    elif response.status_code == 429:
-        raise Exception("429 response. Too many API calls to TomTom.")
-    
-    if response.status_code == 200 and response.json().get("candidates"):
-        r_json = response.json()["candidates"][0]
+    candidates = _tomtom_candidates(response)
+
+    if candidates:
+        r_json = candidates[0]
         try:
             coord1 = r_json["location"]["x"]
             coord2 = r_json["location"]["y"]
@@ -40,10 +89,11 @@ def _fetch_tomtom_coordinates(
 def _do_tomtom_lookup(
     sess: requests.Session,
     parser,
-    philly_zips: list,
+    philly_zips: frozenset,
     address: str,
     fetch_4326: bool,
     fetch_2272: bool,
+    derive_2272: bool = False,
     geocoder_used: str = "tomtom",
 ) -> dict:
     """
@@ -55,25 +105,23 @@ def _do_tomtom_lookup(
         return None 
     
     TOMTOM_RATE_LIMITER.wait()
-    tomtom_url = "https://citygeo-geocoder-aws.phila.city/arcgis/rest/services/TomTom/US_StreetAddress/GeocodeServer/findAddressCandidates"
-    params = {"Address": address, "f": "pjson", "outSR": "4326"}
+    params = {**TOMTOM_PARAMS, "Address": address, "outSR": "4326"}
 
-    response = sess.get(tomtom_url, params=params, timeout=10)
+    response = sess.get(TOMTOM_URL, params=params, timeout=10)
 
-    if response.status_code >= 500:
-        raise Exception("5xx response. There may be a problem with TomTom API server.")
-    elif response.status_code == 429:
-        raise Exception("429 response. Too many API calls to TomTom.")
+    candidates = _tomtom_candidates(response)
 
-    if response.status_code == 200 and response.json().get("candidates"):
-        r_json = response.json()["candidates"][0]
+    if candidates:
+        r_json = candidates[0]
         matched_address = r_json.get("address", "")
-        address_tagged = tag_full_address(matched_address)
+
+        with _PARSE_LOCK:
+            address_tagged = tag_full_address(matched_address)
+            parsed_address = _parse_matched_address(parser, matched_address)
+
         address_flagged = flag_non_philly_address(address_tagged, philly_zips)
         is_philly_addr = not address_flagged["is_non_philly"]
 
-        parsed_address = parser.parse(matched_address).get("components", "").get("output_address", "")
-
         out_data = {}
         out_data["output_address"] = parsed_address if parsed_address else matched_address
         out_data["geocoder_used"] = geocoder_used
@@ -91,7 +139,13 @@ def _do_tomtom_lookup(
                 out_data["geocode_lat"] = None
                 out_data["geocode_lon"] = None            
 
-        if fetch_2272:
+        if fetch_2272 and derive_2272:
+            location = r_json.get("location", {})
+            geo_x, geo_y = to_2272(location.get("x"), location.get("y"))
+            out_data["geocode_x"] = _round_coordinates(geo_x)
+            out_data["geocode_y"] = _round_coordinates(geo_y)
+
+        elif fetch_2272:
             geo_x, geo_y = _fetch_tomtom_coordinates(sess, matched_address, 2272)
             out_data["geocode_x"] = _round_coordinates(geo_x)
             out_data["geocode_y"] = _round_coordinates(geo_y)
@@ -106,15 +160,17 @@ def _do_tomtom_lookup(
     wait_exponential_multiplier=1000,
     wait_exponential_max=10000,
     stop_max_attempt_number=5,
+    wait_jitter_max=1000,
 )
 def tomtom_lookup(
     sess: requests.Session, 
     parser, 
-    philly_zips: list, 
+    philly_zips: frozenset,
     address: str, 
     fallback_addr,
     fetch_4326: bool = True,
     fetch_2272: bool = True,
+    derive_2272: bool = False,
 ) -> dict:
     """
     Given a passyunk-normalized address, looks up via TomTom.
@@ -122,18 +178,22 @@ def tomtom_lookup(
     Args:
         sess (requests Session object): A requests library session object
         parser: A passyunk parser object, used to normalize output
-        philly_zips (list): A list of philadelphia zips to validate
+        philly_zips (frozenset): A set of philadelphia zips to validate
         tomtom output against
         address (str): The address to query
         fallback_addr (str): The address to return if no match is found
         fetch_4326 (bool): Whether or not to pull coordinates in 4326
         fetch_2272 (bool): Whether or not to pull coordinates in 2272
+        derive_2272 (bool): Whether to project the 4326 coordinates to 2272
+        locally instead of making a second request for them
 
     Returns:
         A dict with standardized address, latitude and longitude, returned
         from TomTom.
     """
-    out_data = _do_tomtom_lookup(sess, parser, philly_zips, address, fetch_4326, fetch_2272)
+    out_data = _do_tomtom_lookup(
+        sess, parser, philly_zips, address, fetch_4326, fetch_2272, derive_2272
+    )
     
     if out_data is not None:
         return out_data
@@ -1,4 +1,6 @@
-ZIPS = [
+import polars as pl
+
+ZIPS = frozenset([
     "19120",
     "19121",
     "19122",
@@ -47,4 +49,7 @@ ZIPS = [
     "19146",
     "19147",
     "19148",
-]
+])
+
+# Built once so vectorized is_in checks don't rebuild it per expression
+ZIPS_SERIES = pl.Series("zip", sorted(ZIPS), dtype=pl.String)